@@ -4,18 +4,50 @@
 #    Simeon Reusch (simeon.reusch@desy.de)
 # License: BSD-3-Clause
 
+import copy
 import json
 import logging
-from typing import List, Optional
-
-from astropy.time import Time
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from types import MappingProxyType
+from typing import Iterator, List, Mapping, Optional
+
+import requests
 from penquins import Kowalski  # type: ignore
 
 from planobs.credentials import KOWALSKI_API_TOKEN, KOWALSKI_HOST
 from planobs.models import TooRequest, TooTarget, ValidityWindow
 
+try:
+    from orjson import loads as _decode
+except ImportError:
+    _decode = json.JSONDecoder().decode  # type: ignore
+
 logger = logging.getLogger(__name__)
 
+MJD_EPOCH = datetime(1858, 11, 17, tzinfo=timezone.utc)
+
+# Python errors Kowalski reports when its trigger handler receives a list body.
+# penquins does not expose the HTTP status, so only these exact messages are
+# taken to mean that batching is unsupported.
+BATCH_UNSUPPORTED_ERRORS = (
+    "'list' object has no attribute",
+    "must be a mapping, not list",
+)
+
+
+def _mjd_to_iso_short(mjd: float) -> str:
+    """
+    Convert an MJD to a 'YYYY-MM-DD HH:MM' string (UTC)
+
+    Leap seconds are ignored, which is fine for display purposes. Half a
+    millisecond is added to match the rounding of astropy's iso format.
+    """
+    date = MJD_EPOCH + timedelta(days=mjd, microseconds=500)
+    return date.strftime("%Y-%m-%d %H:%M")
+
 
 class APIError(Exception):
     pass
@@ -26,16 +58,29 @@ class Queue:
     Submit observation triggers to Kowalski, query the queue and delete observation triggers
     """
 
+    # Responses per (host, API token, endpoint), shared by all instances
+    _cache: dict[tuple[str, str, str], tuple[float, dict]] = {}
+
+    # Time of the last successful ping per (host, API token), shared by all instances
+    _ping_cache: dict[tuple[str, str], float] = {}
+    _ping_ttl: float = 300.0
+
     def __init__(
         self,
         user: str,
+        *,
+        cache_ttl: float = 30.0,
+        verify: bool = True,
     ) -> None:
         self.user = user
         self.protocol: str = "https"
         self.host: str = KOWALSKI_HOST
         self.port: int = 443
         self.api_token: Optional[str] = KOWALSKI_API_TOKEN
-        self.queue: dict = {}
+        self._names: list[str] = []
+        self._windows: list[list[float]] = []
+        self._targets: list[list[dict]] = []
+        self._cache_ttl = cache_ttl
 
         if self.api_token is None:
             err = (
@@ -47,31 +92,142 @@ class Queue:
         self.kowalski = Kowalski(
             token=self.api_token, protocol=self.protocol, host=self.host, port=self.port
         )
+
+        if verify:
+            self._verify_token()
+
+    def _verify_token(self) -> None:
+        """
+        Ping Kowalski, unless the token was verified within the last _ping_ttl s
+        """
+        assert self.api_token is not None
+        key = (self.host, self.api_token)
+        last_ping = Queue._ping_cache.get(key)
+        if last_ping is not None and time.monotonic() - last_ping < self._ping_ttl:
+            return
+
         if not self.kowalski.ping():
             err = f"Ping of Kowalski with specified token failed. Are you sure this token is correct? Provided token: {self.api_token}"
             raise APIError(err)
 
-    def get_all_queues(self) -> dict:
+        Queue._ping_cache[key] = time.monotonic()
+
+    @property
+    def queue(self) -> Mapping[int, dict]:
         """
-        Get all the queues
+        Read-only snapshot of the triggers in the queue, keyed by trigger ID.
+        The payloads are copies, so changing them does not affect the queue.
+        Use add_trigger_to_queue to add triggers, or assign a new dict to
+        replace the whole queue.
+        """
+        return MappingProxyType(copy.deepcopy(dict(self.iter_triggers())))
+
+    @queue.setter
+    def queue(self, triggers: Mapping[int, dict]) -> None:
+        """
+        Replace the queue with a dict of trigger payloads. Each payload is
+        validated through TooRequest, as in add_trigger_to_queue.
+        """
+        payloads = []
+        for trigger in triggers.values():
+            unknown_keys = set(trigger) - set(TooRequest.model_fields)
+            if unknown_keys:
+                err = f"Unknown keys in trigger {trigger.get('queue_name')}: {sorted(unknown_keys)}"
+                raise APIError(err)
+
+            payload = TooRequest(**trigger).dict()
+            if payload["user"] != self.user or payload["queue_type"] != "list":
+                err = (
+                    f"Trigger {payload['queue_name']} must have user '{self.user}' "
+                    "and queue_type 'list' to be added to this queue"
+                )
+                raise APIError(err)
+            payloads.append(payload)
+
+        self._invalidate()
+        self._names = [payload["queue_name"] for payload in payloads]
+        self._windows = [payload["validity_window_mjd"] for payload in payloads]
+        self._targets = [payload["targets"] for payload in payloads]
+
+    def __len__(self) -> int:
         """
-        res = self.kowalski.api("get", "/api/triggers/ztf")
+        Number of triggers in the queue
+        """
+        return len(self._names)
+
+    def _iter_payloads(self) -> Iterator[dict]:
+        """
+        Build the Kowalski payload of each trigger in the queue
+        """
+        for name, window, targets in zip(self._names, self._windows, self._targets):
+            yield {
+                "user": self.user,
+                "queue_name": name,
+                "queue_type": "list",
+                "validity_window_mjd": window,
+                "targets": targets,
+            }
+
+    def _payloads(self) -> List[dict]:
+        """
+        Get the Kowalski payloads of all triggers in the queue
+        """
+        return list(self._iter_payloads())
+
+    def _get(self, endpoint: str) -> dict:
+        """
+        Query an endpoint, reusing the response for cache_ttl seconds.
+        The cache is shared by all Queue instances using the same host and token.
+        """
+        assert self.api_token is not None
+        key = (self.host, self.api_token, endpoint)
+
+        if key in Queue._cache:
+            timestamp, res = Queue._cache[key]
+            if time.monotonic() - timestamp < self._cache_ttl:
+                return copy.deepcopy(res)
+
+        res = self.kowalski.api("get", endpoint)
         logger.debug(res)
         if res["status"] != "success":
             err = f"API call failed with status '{res['status']}'' and message '{res['message']}''"
             raise APIError(err)
 
+        if self._cache_ttl > 0:
+            Queue._cache[key] = (time.monotonic(), copy.deepcopy(res))
+
         return res
 
+    def _invalidate(self) -> None:
+        """
+        Drop all cached responses for this host and token
+        """
+        for key in list(Queue._cache):
+            if key[:2] == (self.host, self.api_token):
+                Queue._cache.pop(key, None)
+
+    @contextmanager
+    def _invalidating(self) -> Iterator[None]:
+        """
+        Drop cached responses once the enclosed write to Kowalski has
+        finished, whether it succeeded or not
+        """
+        try:
+            yield
+        finally:
+            self._invalidate()
+
+    def get_all_queues(self) -> dict:
+        """
+        Get all the queues
+        """
+        return self._get("/api/triggers/ztf")
+
     def get_all_queues_nameonly(self) -> list:
         """
         Get the names of all queues
         """
-        res = self.kowalski.api("get", "/api/triggers/ztf")
-        logger.debug(res)
-        if res["status"] != "success":
-            err = f"API call failed with status '{res['status']}'' and message '{res['message']}''"
-            raise APIError(err)
+        res = self._get("/api/triggers/ztf")
 
         res = [x["queue_name"] for x in res["data"]]
         return res
@@ -91,10 +247,9 @@ class Queue:
         """
         Get the ToO queues, return names of ToO triggers only
         """
-        res = self.get_too_queues()
-        logger.debug(res)
+        res = self.get_all_queues()
 
-        resultlist = [x["queue_name"] for x in res["data"]]
+        resultlist = [x["queue_name"] for x in res["data"] if x["is_TOO"]]
 
         return resultlist
 
@@ -103,20 +258,22 @@ class Queue:
         Get the ToO queues, return list of "name: date" for slackbot
         """
 
-        res = self.get_too_queues()
+        res = self.get_all_queues()
         returnlist = []
         for entry in res["data"]:
+            if not entry["is_TOO"]:
+                continue
             name = entry["queue_name"]
-            date_mjd = Time(entry["validity_window_mjd"], format="mjd")
-            date_full = str(date_mjd[0].iso)
-            duration = int((date_mjd[1].value - date_mjd[0].value) * 1440)
-            if q := json.loads(entry["queue"]):
+            start_mjd, end_mjd = entry["validity_window_mjd"]
+            duration = int((end_mjd - start_mjd) * 1440)
+            raw_queue = entry["queue"]
+            if raw_queue and raw_queue != "[]" and (q := _decode(raw_queue)):
                 exposure_time = f"exp: {(q[0]['exposure_time'])}s"
                 field = f"field: {(q[0]['field_id'])}"
             else:
                 exposure_time = "exp: *not available*"
                 field = "field: *not available*"
-            date_short = date_full.split(".")[0][:-3]
+            date_short = _mjd_to_iso_short(start_mjd)
             returnlist.append(
                 f"{name}: {date_short} UT / window length: {duration} min / {exposure_time} / {field})"
             )
@@ -135,8 +292,9 @@ class Queue:
         to the queue (containing all the triggers that will be
         submitted)
         """
+        self._invalidate()
 
-        trigger_id = len(self.queue)
+        trigger_id = len(self._names)
 
         trigger = TooRequest(
             user=self.user,
@@ -147,81 +305,184 @@ class Queue:
             ).export(),
             targets=targets,
         )
-        self.queue.update({trigger_id: trigger.dict()})
+        payload = trigger.dict()
+        self._names.append(payload["queue_name"])
+        self._windows.append(payload["validity_window_mjd"])
+        self._targets.append(payload["targets"])
 
-    def submit_queue(self) -> List[dict]:
+    @staticmethod
+    def _expand_batch_response(res: dict, n_triggers: int) -> List[dict]:
         """
-        Submit the queue of triggers via the Kowalski API
+        Split the response to a batched request into one response per trigger
+        """
+        data = res.get("data")
+        if isinstance(data, list) and len(data) == n_triggers:
+            return [{**res, "data": entry} for entry in data]
+
+        return [dict(res) for _ in range(n_triggers)]
+
+    @staticmethod
+    def _batch_unsupported(res: dict) -> bool:
+        """
+        Check if a batched request failed because Kowalski does not
+        accept a list payload
         """
-        results: List[dict] = []
+        message = str(res.get("message", ""))
+        return res.get("status") == "error" and any(
+            error in message for error in BATCH_UNSUPPORTED_ERRORS
+        )
 
-        for i, trigger in self.queue.items():
+    def _batch_request(self, method: str, data: List[dict]) -> dict:
+        """
+        Send a list of triggers to Kowalski in a single request
+        """
+        try:
             res = self.kowalski.api(
-                method="put", endpoint="/api/triggers/ztf", data=trigger
+                method=method, endpoint="/api/triggers/ztf", data=data
             )
-            logger.debug(res)
+        except requests.RequestException as e:
+            err = (
+                f"Batched request failed ({e}). Some triggers may have been "
+                "processed, check the queue before retrying."
+            )
+            raise APIError(err) from e
 
-            if res["status"] != "success":
-                logger.warning(res)
-                err = "something went wrong with submitting."
-                raise APIError(err)
+        logger.debug(res)
+        return res
 
-            results.append(res)
+    def submit_queue(self, batch: bool = False) -> List[dict]:
+        """
+        Submit the queue of triggers via the Kowalski API
 
-        logger.info(f"Submitted {len(self.queue)} triggers to Kowalski.")
+        With batch=True, all triggers are sent in a single request. Only if
+        Kowalski rejects the list payload as such are the triggers submitted
+        one by one; any other failure raises an APIError.
+        """
+        with self._invalidating():
+            triggers = self._payloads()
 
-        return results
+            if batch and len(triggers) > 1:
+                res = self._batch_request("put", triggers)
 
-    def delete_queue(self) -> None:
-        """
-        Delete all triggers of the queue that have been submitted to Kowalski
-        """
-        results = {}
+                if res["status"] == "success":
+                    logger.info(f"Submitted {len(triggers)} triggers to Kowalski.")
+                    return self._expand_batch_response(res, len(triggers))
 
-        for i, trigger in self.queue.items():
-            req = {"user": self.user, "queue_name": trigger["queue_name"]}
-            res = self.kowalski.api(
-                method="delete", endpoint="/api/triggers/ztf", data=req
-            )
-            logger.debug(res)
-            results.update({i: res})
+                if not self._batch_unsupported(res):
+                    logger.warning(res)
+                    err = (
+                        "something went wrong with submitting the batch. "
+                        "Check the queue before resubmitting."
+                    )
+                    raise APIError(err)
 
-        for i, trigger in self.queue.items():
-            res = results[i]
-            print(res)
-            if res["status"] != "success":
-                err = f"something went wrong with deleting the trigger ({trigger['queue_name']})"
+                logger.info(
+                    f"Batched submission not supported "
+                    f"(message: '{res.get('message')}'), "
+                    "submitting triggers one by one."
+                )
 
-                raise APIError(err)
+            results: List[dict] = []
+
+            for trigger in triggers:
+                res = self.kowalski.api(
+                    method="put", endpoint="/api/triggers/ztf", data=trigger
+                )
+                logger.debug(res)
+
+                if res["status"] != "success":
+                    logger.warning(res)
+                    err = "something went wrong with submitting."
+                    raise APIError(err)
+
+                results.append(res)
+
+            logger.info(f"Submitted {len(triggers)} triggers to Kowalski.")
+
+            return results
+
+    def delete_queue(self, batch: bool = False) -> None:
+        """
+        Delete all triggers of the queue that have been submitted to Kowalski
+
+        With batch=True, all triggers are deleted in a single request. Only if
+        Kowalski rejects the list payload as such are the triggers deleted
+        concurrently, one request per trigger; any other failure raises an
+        APIError.
+        """
+        with self._invalidating():
+            if batch and len(self._names) > 1:
+                reqs = [{"user": self.user, "queue_name": name} for name in self._names]
+                res = self._batch_request("delete", reqs)
+
+                if res["status"] == "success":
+                    return
+
+                if not self._batch_unsupported(res):
+                    logger.warning(res)
+                    err = "something went wrong with deleting the batch of triggers."
+                    raise APIError(err)
+
+                logger.info(
+                    f"Batched deletion not supported "
+                    f"(message: '{res.get('message')}'), "
+                    "deleting triggers one by one."
+                )
+
+            def delete(name: str) -> dict:
+                req = {"user": self.user, "queue_name": name}
+                res = self.kowalski.api(
+                    method="delete", endpoint="/api/triggers/ztf", data=req
+                )
+                logger.debug(res)
+                return res
+
+            # Results are checked in submission order; on failure, the executor still
+            # waits for the remaining requests before the error propagates
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                for name, res in zip(self._names, executor.map(delete, self._names)):
+                    if res["status"] != "success":
+                        err = f"something went wrong with deleting the trigger ({name})"
+
+                        raise APIError(err)
 
     def delete_trigger(self, trigger_name) -> None:
         """
         Delete a trigger that has been submitted
         """
-        req = {"user": self.user, "queue_name": trigger_name}
+        with self._invalidating():
+            req = {"user": self.user, "queue_name": trigger_name}
 
-        res = self.kowalski.api(method="delete", endpoint="/api/triggers/ztf", data=req)
+            res = self.kowalski.api(
+                method="delete", endpoint="/api/triggers/ztf", data=req
+            )
 
-        logger.debug(res)
+            logger.debug(res)
 
-        if res["status"] != "success":
-            err = "something went wrong with deleting the trigger."
-            raise APIError(err)
+            if res["status"] != "success":
+                err = "something went wrong with deleting the trigger."
+                raise APIError(err)
 
-        return res
+            return res
 
     def print(self) -> None:
         """
         Print the content of the queue
         """
-        for i, trigger in self.queue.items():
+        for trigger in self._iter_payloads():
             print(trigger)
 
     def get_triggers(self) -> list:
         """
         Print the content of the queue
         """
-        return [t for t in self.queue.items()]
+        return list(self.iter_triggers())
+
+    def iter_triggers(self) -> Iterator[tuple[int, dict]]:
+        """
+        Iterate over the content of the queue without building a list
+        """
+        return enumerate(self._iter_payloads())
 
     def __del__(self):
         """
@@ -99,5 +99,5 @@ class TooRequest(BaseModel):
         :param field_value: field value
         :return: field_value
         """
-        assert field_value[:4] == "ToO_" or field_value[:5] == "TEST_"
+        assert field_value.startswith(("ToO_", "TEST_"))
         return field_value
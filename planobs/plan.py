@@ -4,9 +4,11 @@
 # License: BSD-3-Clause
 
 import logging
+import math
 import os
 import warnings
 from datetime import datetime
+from functools import cached_property
 
 import astroplan as ap  # type: ignore
 import astropy  # type: ignore
@@ -437,10 +439,11 @@ class PlanObservation:
         ra2 = self.ra + self.ra_err[1]
         dec1 = self.dec + self.dec_err[0]
         dec2 = self.dec + self.dec_err[1]
-        self.area = np.abs(
-            (180 / np.pi) ** 2
-            * (np.radians(ra2) - np.radians(ra1))
-            * (np.sin(np.radians(dec2)) - np.sin(np.radians(dec1)))
+        # Scalar inputs, so math avoids the dispatch overhead of numpy ufuncs
+        self.area = math.fabs(
+            (180 / math.pi) ** 2
+            * (math.radians(ra2) - math.radians(ra1))
+            * (math.sin(math.radians(dec2)) - math.sin(math.radians(dec1)))
         )
 
     def plot_target(self):
@@ -739,6 +742,18 @@ class PlanObservation:
             # no errors -> no coverage -> let's use the more central field
             self.recommended_field = min(self.distance, key=self.distance.get)
 
+    @cached_property
+    def errorbox(self) -> Polygon:
+        """
+        Error box polygon, built once and shared by all field plots
+        """
+        ul = [self.ra + self.ra_err[1], self.dec + self.dec_err[0]]
+        ur = [self.ra + self.ra_err[0], self.dec + self.dec_err[1]]
+        ll = [self.ra + self.ra_err[1], self.dec + self.dec_err[1]]
+        lr = [self.ra + self.ra_err[0], self.dec + self.dec_err[0]]
+
+        return Polygon([ul, ll, ur, lr])
+
     def plot_field(self, f):
         centroid = fields.get_field_centroid(f)
         centroid_coords = SkyCoord(
@@ -762,13 +777,7 @@ class PlanObservation:
 
         cov = None
         if self.ra_err:
-            # Create errorbox
-            ul = [self.ra + self.ra_err[1], self.dec + self.dec_err[0]]
-            ur = [self.ra + self.ra_err[0], self.dec + self.dec_err[1]]
-            ll = [self.ra + self.ra_err[1], self.dec + self.dec_err[1]]
-            lr = [self.ra + self.ra_err[0], self.dec + self.dec_err[0]]
-
-            errorbox = Polygon([ul, ll, ur, lr])
+            errorbox = self.errorbox
             x, y = errorbox.exterior.xy
 
             ax.plot(x, y, color="red")
@@ -110,7 +110,7 @@ class Slackbot:
                         )
                     q.submit_queue()
 
-                    self.multiday_summary += f"\nYOU HAVE TRIGGERED ALL OBSERVATIONS ({len(q.queue)} in total)!\nCheck with 'Queue -get' if they have been added successfully.\nYour triggers:\n"
+                    self.multiday_summary += f"\nYOU HAVE TRIGGERED ALL OBSERVATIONS ({len(q)} in total)!\nCheck with 'Queue -get' if they have been added successfully.\nYour triggers:\n"
 
                     triggertext = multiday_plan.print_triggers()
                     self.multiday_summary += triggertext
@@ -11,6 +11,7 @@ from io import StringIO
 from typing import List, Optional
 
 import astropy  # type: ignore
+import numpy as np
 import pandas as pd  # type: ignore
 import requests
 from astropy import units as u  # type: ignore
@@ -100,6 +101,25 @@ def mjd_to_isotime(mjd: float) -> str:
     return Time(mjd, format="mjd", scale="utc").iso
 
 
+def errorbox_areas(ra, dec, ra_err, dec_err) -> np.ndarray:
+    """
+    Calculate the on-sky area (in sq. deg) of many rectangular error boxes at once.
+    ra, dec are arrays of positions, ra_err, dec_err arrays of shape (N, 2)
+    with the positive and negative errors (as in PlanObservation)
+    """
+    ra = np.asarray(ra, dtype=float)
+    dec = np.asarray(dec, dtype=float)
+    ra_err = np.asarray(ra_err, dtype=float)
+    dec_err = np.asarray(dec_err, dtype=float)
+
+    ra1 = np.radians(ra + ra_err[:, 0])
+    ra2 = np.radians(ra + ra_err[:, 1])
+    dec1 = np.radians(dec + dec_err[:, 0])
+    dec2 = np.radians(dec + dec_err[:, 1])
+
+    return np.abs((180 / np.pi) ** 2 * (ra2 - ra1) * (np.sin(dec2) - np.sin(dec1)))
+
+
 def get_all_references_from_ipac() -> None:
     """
     Query IPAC for all references in case some have changed
@@ -0,0 +1,394 @@
+import copy
+import unittest
+from unittest import mock
+
+import requests
+from astropy.time import Time  # type: ignore
+from planobs import api
+from planobs.api import APIError, Queue
+from planobs.models import TooTarget
+from pydantic import ValidationError
+
+
+class FakeKowalski:
+    """
+    Stand-in for penquins.Kowalski, recording all API calls
+    """
+
+    def __init__(self, **kwargs):
+        self.calls: list = []
+        self.pings = 0
+        self.handler = lambda method, data: {"status": "success", "data": []}
+
+    def ping(self):
+        self.pings += 1
+        return True
+
+    def api(self, method, endpoint, data=None):
+        self.calls.append((method, data))
+        return self.handler(method, data)
+
+    def close(self):
+        pass
+
+
+QUEUE_LISTING = {
+    "status": "success",
+    "data": [
+        {
+            "queue_name": "ToO_a",
+            "is_TOO": True,
+            "validity_window_mjd": [59702.399305555555, 59702.42638888889],
+            "queue": '[{"exposure_time": 30, "field_id": 593}]',
+        },
+        {"queue_name": "b", "is_TOO": False},
+    ],
+}
+
+
+def listing_handler(method, data):
+    if method == "get":
+        return copy.deepcopy(QUEUE_LISTING)
+    return {"status": "success"}
+
+
+def count_gets(*queues: Queue) -> int:
+    return sum(method == "get" for q in queues for method, _ in q.kowalski.calls)
+
+
+class TestMJDFormatting(unittest.TestCase):
+    def test_mjd_to_iso_short(self):
+        boundary = 59702 + (9 * 60 + 35) / 1440
+        mjds = {
+            59702.399305555555: "2022-05-03 09:35",
+            # 86 ms before the minute boundary
+            boundary - 1e-6: "2022-05-03 09:34",
+            # 0.3 ms before the boundary, astropy rounds up to the next minute
+            boundary - 0.0003 / 86400: "2022-05-03 09:35",
+            59710.42361111111: "2022-05-11 10:10",
+        }
+
+        for mjd, expected in mjds.items():
+            with self.subTest(mjd=mjd):
+                self.assertEqual(api._mjd_to_iso_short(mjd), expected)
+                astropy_iso = Time(mjd, format="mjd").iso.split(".")[0][:-3]
+                self.assertEqual(api._mjd_to_iso_short(mjd), astropy_iso)
+
+
+class TestQueue(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.multiple(
+            api, Kowalski=FakeKowalski, KOWALSKI_API_TOKEN="test_token"
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        Queue._cache.clear()
+        Queue._ping_cache.clear()
+
+    def make_queue(self, n_triggers: int = 3) -> Queue:
+        q = Queue(user="DESY")
+        for i in range(n_triggers):
+            q.add_trigger_to_queue(
+                targets=[TooTarget(field_id=593, filter_id=1)],
+                trigger_name="TEST",
+                validity_window_start_mjd=59702.3 + i,
+                validity_window_end_mjd=59702.4 + i,
+            )
+        q.kowalski.calls.clear()
+        return q
+
+    def test_submit_unbatched_by_default(self):
+        q = self.make_queue()
+        results = q.submit_queue()
+
+        self.assertEqual(len(results), 3)
+        self.assertEqual(len(q.kowalski.calls), 3)
+        for method, data in q.kowalski.calls:
+            self.assertEqual(method, "put")
+            self.assertIsInstance(data, dict)
+
+    def test_submit_batch_success(self):
+        q = self.make_queue()
+        results = q.submit_queue(batch=True)
+
+        self.assertEqual(len(q.kowalski.calls), 1)
+        method, data = q.kowalski.calls[0]
+        self.assertEqual(method, "put")
+        self.assertEqual(
+            [x["queue_name"] for x in data], ["TEST_0", "TEST_1", "TEST_2"]
+        )
+
+        self.assertEqual(len(results), 3)
+        results[0]["status"] = "changed"
+        self.assertEqual(results[1]["status"], "success")
+
+    def test_submit_batch_unsupported_falls_back(self):
+        q = self.make_queue()
+        q.kowalski.handler = lambda method, data: (
+            {"status": "error", "message": "'list' object has no attribute 'get'"}
+            if isinstance(data, list)
+            else {"status": "success"}
+        )
+        results = q.submit_queue(batch=True)
+
+        self.assertEqual(len(results), 3)
+        self.assertEqual(len(q.kowalski.calls), 4)
+        self.assertIsInstance(q.kowalski.calls[0][1], list)
+
+    def test_submit_batch_failure_does_not_resubmit(self):
+        q = self.make_queue()
+        q.kowalski.handler = lambda method, data: {
+            "status": "error",
+            "message": "queue TEST_1 already exists",
+        }
+
+        with self.assertRaises(APIError):
+            q.submit_queue(batch=True)
+        self.assertEqual(len(q.kowalski.calls), 1)
+
+    def test_submit_batch_validation_error_does_not_resubmit(self):
+        messages = [
+            "failure: filter_id 4 not supported",
+            "failure: validity_window_mjd array must have 2 entries",
+            "unsupported queue_type",
+        ]
+
+        for message in messages:
+            with self.subTest(message=message):
+                q = self.make_queue()
+                q.kowalski.handler = lambda method, data: {
+                    "status": "error",
+                    "message": message,
+                }
+
+                with self.assertRaises(APIError):
+                    q.submit_queue(batch=True)
+                self.assertEqual(len(q.kowalski.calls), 1)
+
+    def test_submit_batch_request_exception(self):
+        q = self.make_queue()
+
+        def handler(method, data):
+            raise requests.exceptions.RetryError("max retries exceeded")
+
+        q.kowalski.handler = handler
+
+        with self.assertRaises(APIError):
+            q.submit_queue(batch=True)
+        self.assertEqual(len(q.kowalski.calls), 1)
+
+    def test_delete_batch_success(self):
+        q = self.make_queue()
+        q.delete_queue(batch=True)
+
+        self.assertEqual(
+            q.kowalski.calls,
+            [
+                (
+                    "delete",
+                    [{"user": "DESY", "queue_name": f"TEST_{i}"} for i in range(3)],
+                )
+            ],
+        )
+
+    def test_delete_batch_unsupported_falls_back(self):
+        q = self.make_queue()
+        q.kowalski.handler = lambda method, data: (
+            {
+                "status": "error",
+                "message": "failure: argument after ** must be a mapping, not list",
+            }
+            if isinstance(data, list)
+            else {"status": "success"}
+        )
+        q.delete_queue(batch=True)
+
+        self.assertEqual(len(q.kowalski.calls), 4)
+        deleted = sorted(data["queue_name"] for _, data in q.kowalski.calls[1:])
+        self.assertEqual(deleted, ["TEST_0", "TEST_1", "TEST_2"])
+
+    def test_delete_batch_failure_does_not_retry(self):
+        q = self.make_queue()
+        q.kowalski.handler = lambda method, data: {
+            "status": "error",
+            "message": "queue TEST_2 not found",
+        }
+
+        with self.assertRaises(APIError):
+            q.delete_queue(batch=True)
+        self.assertEqual(len(q.kowalski.calls), 1)
+
+    def test_cache_shared_between_instances(self):
+        q1 = Queue(user="DESY")
+        q2 = Queue(user="DESY")
+        for q in (q1, q2):
+            q.kowalski.handler = listing_handler
+
+        self.assertEqual(q1.get_too_queues_nameonly(), ["ToO_a"])
+        self.assertEqual(q2.get_all_queues_nameonly(), ["ToO_a", "b"])
+        self.assertEqual(count_gets(q1, q2), 1)
+
+    def test_cache_returns_copy(self):
+        q = Queue(user="DESY")
+        q.kowalski.handler = listing_handler
+
+        q.get_all_queues()["data"].clear()
+        q.get_all_queues()["data"].clear()
+        self.assertEqual(q.get_all_queues_nameonly(), ["ToO_a", "b"])
+        self.assertEqual(count_gets(q), 1)
+
+    def test_cache_expires(self):
+        q = Queue(user="DESY", cache_ttl=30.0)
+        q.kowalski.handler = listing_handler
+
+        with mock.patch.object(api.time, "monotonic", return_value=1000.0):
+            q.get_all_queues()
+        with mock.patch.object(api.time, "monotonic", return_value=1029.0):
+            q.get_all_queues()
+        self.assertEqual(count_gets(q), 1)
+
+        with mock.patch.object(api.time, "monotonic", return_value=1031.0):
+            q.get_all_queues()
+        self.assertEqual(count_gets(q), 2)
+
+    def test_cache_disabled(self):
+        q = Queue(user="DESY", cache_ttl=0)
+        q.kowalski.handler = listing_handler
+
+        q.get_all_queues()
+        q.get_all_queues()
+        self.assertEqual(count_gets(q), 2)
+        self.assertEqual(Queue._cache, {})
+
+    def test_cache_invalidated_by_mutating_methods(self):
+        mutations = {
+            "add_trigger_to_queue": lambda q: q.add_trigger_to_queue(
+                targets=[TooTarget(field_id=593, filter_id=1)],
+                trigger_name="TEST",
+                validity_window_start_mjd=59702.3,
+                validity_window_end_mjd=59702.4,
+            ),
+            "submit_queue": lambda q: q.submit_queue(),
+            "delete_queue": lambda q: q.delete_queue(),
+            "delete_trigger": lambda q: q.delete_trigger("TEST_0"),
+        }
+
+        for name, mutate in mutations.items():
+            with self.subTest(method=name):
+                Queue._cache.clear()
+                q = self.make_queue(n_triggers=1)
+                q.kowalski.handler = listing_handler
+
+                q.get_all_queues()
+                mutate(q)
+                q.get_all_queues()
+                self.assertEqual(count_gets(q), 2)
+
+    def test_queue_snapshot_is_read_only(self):
+        q = self.make_queue()
+
+        self.assertEqual(len(q), 3)
+        self.assertEqual(len(q.queue), 3)
+        with self.assertRaises(TypeError):
+            q.queue[3] = q.queue[0]
+        with self.assertRaises(AttributeError):
+            q.queue.clear()
+
+    def test_queue_assignment_replaces_queue(self):
+        q = self.make_queue()
+        triggers = dict(q.queue)
+
+        q.queue = {}
+        self.assertEqual(len(q), 0)
+        self.assertEqual(q.get_triggers(), [])
+
+        q.queue = {0: triggers[2]}
+        self.assertEqual(q.get_triggers(), [(0, triggers[2])])
+
+    def test_ping_cached_per_token(self):
+        with mock.patch.object(api.time, "monotonic", return_value=1000.0):
+            q1 = Queue(user="DESY")
+        with mock.patch.object(api.time, "monotonic", return_value=1299.0):
+            q2 = Queue(user="DESY")
+        self.assertEqual(q1.kowalski.pings, 1)
+        self.assertEqual(q2.kowalski.pings, 0)
+
+        with mock.patch.object(api.time, "monotonic", return_value=1301.0):
+            q3 = Queue(user="DESY")
+        self.assertEqual(q3.kowalski.pings, 1)
+
+    def test_verify_false_never_pings(self):
+        q = Queue(user="DESY", verify=False)
+        self.assertEqual(q.kowalski.pings, 0)
+        self.assertEqual(Queue._ping_cache, {})
+
+    def test_options_are_keyword_only(self):
+        with self.assertRaises(TypeError):
+            Queue("DESY", False)
+
+    def test_cache_invalidated_after_write_completes(self):
+        server: list = []
+        q1 = self.make_queue(n_triggers=1)
+        q2 = Queue(user="DESY")
+
+        def listing(method, data):
+            return {
+                "status": "success",
+                "data": [{"queue_name": name, "is_TOO": True} for name in server],
+            }
+
+        def slow_put(method, data):
+            # Another instance lists while the PUT is in flight
+            self.assertEqual(q2.get_all_queues_nameonly(), [])
+            server.append(data["queue_name"])
+            return {"status": "success"}
+
+        q2.kowalski.handler = listing
+        q1.kowalski.handler = slow_put
+
+        q1.submit_queue()
+        self.assertEqual(q2.get_all_queues_nameonly(), ["TEST_0"])
+
+    def test_cache_invalidated_after_failed_write(self):
+        q = self.make_queue(n_triggers=1)
+        q.kowalski.handler = listing_handler
+        q.get_all_queues()
+
+        q.kowalski.handler = lambda method, data: (
+            listing_handler(method, data)
+            if method == "get"
+            else {"status": "error", "message": "failed"}
+        )
+        with self.assertRaises(APIError):
+            q.delete_trigger("TEST_0")
+        self.assertEqual(Queue._cache, {})
+
+    def test_queue_snapshot_payloads_are_copies(self):
+        q = self.make_queue(n_triggers=1)
+
+        q.queue[0]["targets"].clear()
+        q.queue[0]["validity_window_mjd"].append(59703.0)
+        self.assertEqual(len(q.queue[0]["targets"]), 1)
+        self.assertEqual(q.queue[0]["validity_window_mjd"], [59702.3, 59702.4])
+
+    def test_queue_assignment_is_validated(self):
+        q = self.make_queue(n_triggers=1)
+        trigger = dict(q.queue[0])
+
+        invalid = {
+            "queue_name": {**trigger, "queue_name": "BAD_0"},
+            "window": {**trigger, "validity_window_mjd": [59702.4, 59702.3, 1.0]},
+            "targets": {**trigger, "targets": []},
+        }
+        for name, bad_trigger in invalid.items():
+            with self.subTest(field=name):
+                with self.assertRaises(ValidationError):
+                    q.queue = {0: bad_trigger}
+
+        with self.assertRaises(APIError):
+            q.queue = {0: {**trigger, "user": "someone_else"}}
+        with self.assertRaises(APIError):
+            q.queue = {0: {**trigger, "priority": 1}}
+
+        # A failed assignment leaves the queue unchanged
+        self.assertEqual(q.get_triggers(), [(0, trigger)])
@@ -0,0 +1,24 @@
+import unittest
+from types import SimpleNamespace
+
+import numpy as np
+from planobs.plan import PlanObservation
+from planobs.utils import errorbox_areas
+
+
+class TestUtils(unittest.TestCase):
+    def test_errorbox_areas(self):
+        ra = np.array([10.0, 200.0, 359.0])
+        dec = np.array([5.0, -30.0, 85.0])
+        ra_err = np.array([[1.0, -0.8], [2.0, -1.0], [0.5, -0.5]])
+        dec_err = np.array([[0.5, -0.6], [1.0, -1.5], [0.3, -0.2]])
+
+        areas = errorbox_areas(ra, dec, ra_err, dec_err)
+
+        self.assertEqual(areas.shape, (3,))
+        for i, area in enumerate(areas):
+            plan = SimpleNamespace(
+                ra=ra[i], dec=dec[i], ra_err=list(ra_err[i]), dec_err=list(dec_err[i])
+            )
+            PlanObservation.calculate_area(plan)
+            self.assertAlmostEqual(area, plan.area, places=10)